@@ -0,0 +1,48 @@
+"""
+Ahead-of-time build of the float64 RG-flow kernels.
+Usage: python _rg_flow_kernels.py
+
+Compiles the Euler and RK4 loops and the linear recurrence from rg_flow_analysis.py
+with numba.pycc into a _rg_kernels extension module next to this file.
+rg_flow_analysis imports it when present and uses it for float64 grids, so
+those kernels skip JIT compilation and cache loading; float32 grids and the
+batch sweep still use the numba JIT kernels (compiled on first use). The
+built extension is platform-specific and not tracked (*.so is ignored). It
+records a hash of the kernel source, and rg_flow_analysis ignores it (with a
+warning) once the kernels change; rerun this script to rebuild.
+"""
+import importlib.util
+import sys
+from pathlib import Path
+
+from numba.pycc import CC
+
+_HERE = Path(__file__).resolve().parent
+_rg_path = _HERE / 'rg_flow_analysis.py'
+spec = importlib.util.spec_from_file_location('rg_flow_analysis', str(_rg_path))
+_rg = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = _rg  # registered first, so numba's on-disk cache can re-import it
+spec.loader.exec_module(_rg)
+
+
+def build(output_dir=_HERE):
+    cc = CC('_rg_kernels')
+    cc.output_dir = str(output_dir)
+    euler, rk4, recurrence = _rg._KERNEL_SOURCES
+    cc.export('euler_toy_beta_f64', 'f8[:](f8[:], f8, f8, f8, f8)')(euler)
+    cc.export('rk4_toy_beta_f64', 'f8[:](f8[:], f8, f8, f8, f8)')(rk4)
+    cc.export('linear_recurrence_f64', 'f8[:](f8[:], f8, f8)')(recurrence)
+
+    # rg_flow_analysis ignores the extension unless this matches its kernel source
+    kernel_hash = _rg._kernel_source_hash()
+
+    def source_hash():
+        return kernel_hash
+
+    cc.export('source_hash', 'i8()')(source_hash)
+    cc.compile()
+    return cc.output_file
+
+
+if __name__ == '__main__':
+    print(f"Built {build()}")
@@ -4,14 +4,29 @@ Author: Chris Lehto
 Date: January 29, 2026
 
 Conservative correction for post-hoc hypothesis (noticing delta=24 in the data).
-Scans delta from 22 to 26 in steps of 0.05 and records maximum strong matches
+Scans delta continuously over [22, 26] and records maximum strong matches
 achieved at any delta value per permutation.
 """
 
+import argparse
+import importlib.util
+import sys
+from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+# Import the shared permutation kernel from octave_analysis
+_oa_path = Path(__file__).resolve().parent / 'octave_analysis.py'
+spec = importlib.util.spec_from_file_location('octave_analysis', str(_oa_path))
+_oa = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = _oa  # registered first, so numba's on-disk cache can re-import it
+spec.loader.exec_module(_oa)
+
+parser = argparse.ArgumentParser(description="Look-Elsewhere / Delta-Scan Correction")
+parser.add_argument('--numba', action='store_true',
+                    help="Use the compiled permutation kernel (fast when numba is installed)")
+args = parser.parse_args()
+
 # 15 log10(L) values (same as permutation_test.py)
 logs = np.array([
     -15.08, -10.28, -7.96, -6.00, -3.30, -0.046, 3.00,
@@ -27,29 +42,41 @@ def get_deviations(array, delta):
     """Calculate deviations from specified delta for all pairs."""
     return np.array([abs((array[j] - array[i]) - delta) for i, j in pairs])
 
-def max_strong_matches_in_scan(array, delta_min=22.0, delta_max=26.0, step=0.05):
-    """Find maximum number of strong matches (<=0.2) across delta scan."""
-    deltas = np.arange(delta_min, delta_max + step/2, step)
-    max_strong = 0
-    best_delta = None
-    
-    for delta in deltas:
-        devs = get_deviations(array, delta)
-        strong = np.sum(devs <= 0.2)
-        if strong > max_strong:
-            max_strong = strong
-            best_delta = delta
-    
-    return max_strong, best_delta
+def plot_results(obs_max_strong, hist):
+    """Create histogram of delta-scan permutation results (hist[k] = trials with max k)."""
+    # Deferred so the permutation run does not pay for loading matplotlib
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    plt.figure(figsize=(10, 6))
+    shown = hist[:np.flatnonzero(hist)[-1] + 1]  # drop the empty tail
+    plt.bar(np.arange(len(shown)), shown, width=1.0, align='edge',
+            alpha=0.7, edgecolor='black', color='coral')
+    plt.axvline(obs_max_strong, color='red', linestyle='--', linewidth=2,
+                label=f'Observed: {obs_max_strong} max strong')
+    plt.xlabel('Maximum Strong Matches (any delta in [22, 26])', fontsize=12)
+    plt.ylabel(f'Frequency (out of {hist.sum():,} trials)', fontsize=12)
+    plt.title('Look-Elsewhere Correction: Delta-Scan Results\n' + 
+              'Maximum strong matches across delta in [22, 26]',
+              fontsize=14, fontweight='bold')
+    plt.legend(fontsize=11)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+    save_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'figures'))
+    os.makedirs(save_dir, exist_ok=True)
+    save_path = os.path.join(save_dir, 'delta_scan_histogram.png')
+    plt.savefig(save_path, dpi=300, bbox_inches='tight')
+    print(f"\nHistogram saved to {save_path}")
+    plt.close()
 
 print("=" * 70)
 print("DELTA-SCAN / LOOK-ELSEWHERE CORRECTION")
 print("=" * 70)
-print("\nScanning delta from 22.0 to 26.0 (step 0.05)")
+print("\nScanning delta continuously over [22.0, 26.0]")
 print("Finding maximum strong matches (<=0.2) at any delta...")
 
 # Observed data
-obs_max_strong, obs_best_delta = max_strong_matches_in_scan(logs)
+obs_max_strong, obs_best_delta = _oa.max_strong_matches_in_scan(logs, pairs=pairs)
 print(f"\nObserved data:")
 print(f"  Maximum strong matches: {obs_max_strong}")
 print(f"  Best delta in scan: {obs_best_delta:.2f}")
@@ -59,24 +86,22 @@ devs_at_24 = get_deviations(logs, 24.0)
 strong_at_24 = np.sum(devs_at_24 <= 0.2)
 print(f"  Strong matches at delta=24.0: {strong_at_24}")
 
-print(f"\nRunning permutation test with delta scan...")
-print("(This may take 3-5 minutes)\n")
+print(f"\nRunning permutation test with delta scan...\n")
 
 # Permutation test with delta scan
 n_trials = 200000
-rng = np.random.default_rng(42)
-max_strong_counts = []
-count_exceeds = 0
-
-for i in range(n_trials):
-    permuted = rng.permutation(logs)
-    max_strong, _ = max_strong_matches_in_scan(permuted)
-    max_strong_counts.append(max_strong)
-    if max_strong >= obs_max_strong:
-        count_exceeds += 1
-    
-    if (i + 1) % 20000 == 0:
-        print(f"  Progress: {i+1:,} / {n_trials:,} trials ({(i+1)/n_trials*100:.0f}%)")
+
+if args.numba:
+    # Shared compiled kernel in scan mode (same exact window count as below)
+    hist, count_exceeds = _oa.run_permutation_test(logs, obs_max_strong, threshold=0.2, pairs=pairs,
+                                                   n_trials=n_trials, seed=42, mode='scan',
+                                                   delta_range=(22.0, 26.0))
+else:
+    # Shared single pass with permutation_test.py (same seed, same permutations)
+    _, max_strong_counts = _oa.joint_run(logs, delta_center=24.0, delta_range=(22.0, 26.0),
+                                         threshold=0.2, pairs=pairs, n_trials=n_trials, seed=42)
+    hist = np.bincount(max_strong_counts, minlength=len(pairs) + 1)
+    count_exceeds = int(hist[obs_max_strong:].sum())
 
 p_scan = count_exceeds / n_trials
 
@@ -92,25 +117,7 @@ print(f"Conservative upper bound (add-one): {p_scan_upper:.6f} ({p_scan_upper*10
 print("=" * 70)
 
 # Create histogram
-plt.figure(figsize=(10, 6))
-plt.hist(max_strong_counts, bins=range(0, max(max_strong_counts)+2),
-         alpha=0.7, edgecolor='black', color='coral')
-plt.axvline(obs_max_strong, color='red', linestyle='--', linewidth=2,
-            label=f'Observed: {obs_max_strong} max strong')
-plt.xlabel('Maximum Strong Matches (any delta in [22, 26])', fontsize=12)
-plt.ylabel('Frequency (out of 200,000 trials)', fontsize=12)
-plt.title('Look-Elsewhere Correction: Delta-Scan Results\n' + 
-          'Maximum strong matches across delta in [22, 26], step 0.05',
-          fontsize=14, fontweight='bold')
-plt.legend(fontsize=11)
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-save_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'figures'))
-os.makedirs(save_dir, exist_ok=True)
-save_path = os.path.join(save_dir, 'delta_scan_histogram.png')
-plt.savefig(save_path, dpi=300, bbox_inches='tight')
-print(f"\nHistogram saved to {save_path}")
-plt.close()
+plot_results(obs_max_strong, hist)
 
 print("\n" + "=" * 70)
 print("INTERPRETATION")
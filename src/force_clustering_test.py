@@ -1,6 +1,6 @@
 """
 Force Clustering / Expanded Permutation Test - Cross-Domain Version
-Usage: python force_clustering_test.py [--n_trials 200000] [--cross-only] [--append-dmde] [--smoke]
+Usage: python force_clustering_test.py [--n_trials 200000] [--cross-only] [--append-dmde] [--smoke] [--numba] [--adaptive]
 
 Counts octave matches (diff ≈ delta) only between structures and force scales (cross-domain).
 This avoids combinatorial explosion and directly tests if force scales align with the cosmic ladder.
@@ -10,14 +10,15 @@ import csv
 import os
 from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
 import importlib.util
+import sys
 
 # Import DEFAULT_LOGS from octave_analysis
 _ROOT = Path(__file__).resolve().parents[1]
 _oa_path = _ROOT / 'src' / 'octave_analysis.py'
 spec = importlib.util.spec_from_file_location('octave_analysis', str(_oa_path))
 _oa = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = _oa  # registered first, so numba's on-disk cache can re-import it
 spec.loader.exec_module(_oa)
 DEFAULT_LOGS = _oa.DEFAULT_LOGS
 
@@ -38,23 +39,22 @@ def load_force_scales(csv_path: str):
     return np.array(logs), names
 
 def count_strong_cross_domain(arr, n_base, delta=24.0, thresh=0.2):
-    """Count strong matches only between base structures (0..n_base-1) and added scales (n_base..end)"""
-    strong = 0
-    for i in range(n_base):
-        for j in range(n_base, len(arr)):
-            if abs((arr[j] - arr[i]) - delta) <= thresh:
-                strong += 1
-    return strong
+    """Count strong matches only between base structures (0..n_base-1) and added scales (n_base..end).
+
+    `arr` may be a single array or a batch of permutations of shape (n_trials, n_total).
+    """
+    arr = np.asarray(arr)
+    diff = arr[..., n_base:, None] - arr[..., None, :n_base]
+    return np.count_nonzero(np.abs(diff - delta) <= thresh, axis=(-2, -1))
 
 def count_strong_all_pairs(arr, delta=24.0, thresh=0.2):
-    """Original all-pairs count (for comparison only - noisy)"""
-    n = len(arr)
-    strong = 0
-    for i in range(n):
-        for j in range(i+1, n):
-            if abs((arr[j] - arr[i]) - delta) <= thresh:
-                strong += 1
-    return strong
+    """Original all-pairs count (for comparison only - noisy)
+
+    `arr` may be a single array or a batch of permutations of shape (n_trials, n_total).
+    """
+    arr = np.asarray(arr)
+    D = np.abs(arr[..., None, :] - arr[..., :, None] - delta)
+    return np.count_nonzero(np.triu(D <= thresh, k=1), axis=(-2, -1))
 
 def main():
     parser = argparse.ArgumentParser(description="Force Clustering Permutation Test")
@@ -66,7 +66,13 @@ def main():
     parser.add_argument('--append-dmde', action='store_true', help="Append speculative DM/DE scales")
     parser.add_argument('--cross-only', action='store_true', default=True, 
                         help="Count only cross-domain pairs (structures vs force/DMDE) [recommended]")
+    parser.add_argument('--numba', action='store_true',
+                        help="Use the compiled permutation kernel from octave_analysis")
+    parser.add_argument('--adaptive', action='store_true',
+                        help="Stop early once the 99.9%% CI on the p-value settles (n_trials is the cap)")
     args = parser.parse_args()
+    if args.adaptive and args.numba:
+        parser.error("--adaptive runs the NumPy path in batches; drop --numba")
 
     if args.smoke:
         args.n_trials = min(args.n_trials, 2000)
@@ -104,10 +110,12 @@ def main():
     # Choose counting function
     if args.cross_only:
         count_func = lambda arr: count_strong_cross_domain(arr, n_base, args.delta, args.threshold)
+        mode = 'cross'
         pairs_tested = n_base * n_added
         print(f"Counting cross-domain pairs only: {pairs_tested} possible pairs")
     else:
         count_func = lambda arr: count_strong_all_pairs(arr, args.delta, args.threshold)
+        mode = 'all_pairs'
         pairs_tested = n_total * (n_total - 1) // 2
         print(f"Counting ALL pairwise matches: {pairs_tested} possible pairs (noisy)")
 
@@ -122,16 +130,40 @@ def main():
     print(f'\nObserved strong matches (<= {args.threshold}): {observed_strong}')
 
     print('\nRunning permutation test...')
-    count_exceeds = 0
-    random_counts = []
-    for i in range(args.n_trials):
-        perm = rng.permutation(logs)
-        s = count_func(perm)
-        random_counts.append(s)
-        if s >= observed_strong:
-            count_exceeds += 1
-        if (i + 1) % max(1, args.n_trials // 10) == 0:
-            print(f'  Progress: {i+1:,} / {args.n_trials:,} trials ({(i+1)/args.n_trials*100:.0f}%)')
+    if args.numba:
+        # Shared compiled kernel in the matching counting mode
+        hist, count_exceeds = _oa.run_permutation_test(logs, observed_strong, delta=args.delta,
+                                                       threshold=args.threshold,
+                                                       n_trials=args.n_trials, seed=args.seed,
+                                                       mode=mode, n_base=n_base)
+    else:
+        # Permutations are processed in batches of index rows; each batch is
+        # gathered into a (batch, n_total) array and counted in one broadcast.
+        # The index and gather buffers are allocated once and reused.
+        # Adaptive runs use small batches so the stopping rule is checked often.
+        batch = 2048 if args.adaptive else max(1, min(args.n_trials // 10, 10000))
+        idx_buf = np.empty((batch, n_total), dtype=np.int8)
+        perm_buf = np.empty((batch, n_total), dtype=logs.dtype)
+        hist = np.zeros(pairs_tested + 1, dtype=np.int64)
+        count_exceeds = 0
+        done = 0
+        while done < args.n_trials:
+            n = min(batch, args.n_trials - done)
+            idx, perm = idx_buf[:n], perm_buf[:n]
+            idx[:] = np.arange(n_total, dtype=np.int8)
+            rng.permuted(idx, axis=1, out=idx)
+            np.take(logs, idx, out=perm)
+            counts = count_func(perm)
+            hist += np.bincount(counts, minlength=len(hist))
+            count_exceeds += int((counts >= observed_strong).sum())
+            done += n
+            if args.adaptive:
+                if _oa.should_stop_early(count_exceeds, done):
+                    print(f'  Adaptive stop after {done:,} trials')
+                    break
+            else:
+                print(f'  Progress: {done:,} / {args.n_trials:,} trials ({done/args.n_trials*100:.0f}%)')
+        args.n_trials = done
 
     p = count_exceeds / args.n_trials
     p_upper = (count_exceeds + 1) / (args.n_trials + 1)
@@ -144,12 +176,17 @@ def main():
     print(f'Conservative upper bound (add-one): {p_upper:.6f} ({p_upper*100:.4f}%)')
     print('='*70)
 
-    # Histogram
+    # Histogram (matplotlib is only loaded once the permutations are done)
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
     save_dir = Path(__file__).resolve().parents[1] / 'figures'
     os.makedirs(save_dir, exist_ok=True)
     plt.figure(figsize=(10, 6))
-    plt.hist(random_counts, bins=range(min(random_counts), max(random_counts)+2), 
-             color='purple', alpha=0.7, edgecolor='black')
+    seen = np.flatnonzero(hist)
+    bins = np.arange(seen[0], seen[-1] + 1)
+    plt.bar(bins, hist[bins], width=1.0, align='edge',
+            color='purple', alpha=0.7, edgecolor='black')
     plt.axvline(observed_strong, color='red', linestyle='--', linewidth=2, 
                 label=f'Observed: {observed_strong}')
     plt.xlabel('Number of Strong Matches')
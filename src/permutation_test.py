@@ -9,10 +9,29 @@ Uses permutation testing with fixed random seed for reproducibility.
 This version matches the final paper with 15 structures and 7 canonical pairs.
 """
 
+import argparse
+import importlib.util
+import sys
+from pathlib import Path
 import numpy as np
-import matplotlib.pyplot as plt
 import os
 
+# Import the compiled permutation kernel from octave_analysis
+_oa_path = Path(__file__).resolve().parent / 'octave_analysis.py'
+spec = importlib.util.spec_from_file_location('octave_analysis', str(_oa_path))
+_oa = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = _oa  # registered first, so numba's on-disk cache can re-import it
+spec.loader.exec_module(_oa)
+
+parser = argparse.ArgumentParser(description="Cosmic Octaves Permutation Test")
+parser.add_argument('--numba', action='store_true',
+                    help="Use the compiled permutation kernel (fast when numba is installed)")
+parser.add_argument('--adaptive', action='store_true',
+                    help="Stop early once the 99.9%% CI on the p-value settles (at most 200,000 trials)")
+args = parser.parse_args()
+if args.adaptive and args.numba:
+    parser.error("--adaptive runs the NumPy path in blocks; drop --numba")
+
 # 15 log10(L) values from verified scale table
 # Order: [Proton, AtomicOrbital, Ribosome, Bacterium, C_elegans, Human, City,
 #         Earth, Sun, SolarSystem, OpenCluster, LocalBubble, MilkyWay, VirgoSC, ObsUniverse]
@@ -49,15 +68,20 @@ def get_deviations(array, delta=24.0):
     """Calculate deviations from ideal delta ratio for all pairs."""
     return np.array([abs((array[j] - array[i]) - delta) for i, j in pairs])
 
-def plot_results(observed_strong, random_strong_counts):
-    """Create histogram of permutation test results."""
+def plot_results(observed_strong, hist):
+    """Create histogram of permutation test results (hist[k] = trials with k strong matches)."""
+    # Deferred so the permutation run does not pay for loading matplotlib
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(10, 6))
-    plt.hist(random_strong_counts, bins=range(0, max(random_strong_counts)+2), 
-             alpha=0.7, edgecolor='black', color='steelblue')
+    shown = hist[:np.flatnonzero(hist)[-1] + 1]  # drop the empty tail
+    plt.bar(np.arange(len(shown)), shown, width=1.0, align='edge',
+            alpha=0.7, edgecolor='black', color='steelblue')
     plt.axvline(observed_strong, color='red', linestyle='--', linewidth=2,
                 label=f'Observed: {observed_strong} strong matches')
     plt.xlabel('Number of Strong Matches (deviation <=0.2)', fontsize=12)
-    plt.ylabel('Frequency (out of 200,000 trials)', fontsize=12)
+    plt.ylabel(f'Frequency (out of {hist.sum():,} trials)', fontsize=12)
     plt.title('Permutation Test Results: Cosmic Octave Pattern\n15 Structures, 7 Canonical Pairs', 
               fontsize=14, fontweight='bold')
     plt.legend(fontsize=11)
@@ -80,34 +104,67 @@ print("Configuration: 15 structures, 7 canonical pairs")
 print("=" * 70)
 print(f"\nObserved deviations: {np.round(observed_deviations, 3)}")
 print(f"Observed strong matches (<=0.2): {observed_strong}")
-print(f"\nRunning permutation test with 200,000 trials...")
-print("(This may take 1-2 minutes)\n")
+print(f"\nRunning permutation test with {'up to ' if args.adaptive else ''}200,000 trials...\n")
 
 # Permutation test with fixed seed
 n_trials = 200000
-count = 0
-random_strong_counts = []
-rng = np.random.default_rng(42)  # Fixed seed for reproducibility
-
-for i in range(n_trials):
-    permuted = rng.permutation(logs)
-    strong = np.sum(get_deviations(permuted) <= 0.2)
-    random_strong_counts.append(strong)
-    if strong >= observed_strong:
-        count += 1
-    
-    # Progress indicator
-    if (i + 1) % 20000 == 0:
-        print(f"  Progress: {i+1:,} / {n_trials:,} trials ({(i+1)/n_trials*100:.0f}%)")
+
+if args.numba:
+    # Compiled Fisher-Yates kernel; accumulates the histogram of strong counts directly
+    hist, count = _oa.run_permutation_test(logs, observed_strong, delta=24.0, threshold=0.2,
+                                           pairs=pairs, n_trials=n_trials, seed=42)
+elif args.adaptive:
+    # Each permutation is a row of shuffled indices 0..14, and its pair
+    # differences are gathered from the precomputed table D[j, i] = L_j - L_i.
+    rng = np.random.default_rng(42)  # Fixed seed for reproducibility
+    I = np.array([p[0] for p in pairs], dtype=np.int8)
+    J = np.array([p[1] for p in pairs], dtype=np.int8)
+    D = _oa.diff_table(logs)
+
+    # Draw blocks of 2048 permutations into a running histogram and stop
+    # once the verdict is settled
+    block = 2048
+    idx_buf = np.empty((block, len(logs)), dtype=np.int8)
+    hist = np.zeros(len(pairs) + 1, dtype=np.int64)
+    count = 0
+    done = 0
+    while done < n_trials:
+        n = min(block, n_trials - done)
+        idx = idx_buf[:n]
+        idx[:] = np.arange(len(logs), dtype=np.int8)
+        rng.permuted(idx, axis=1, out=idx)
+        strong = (np.abs(D[idx[:, J], idx[:, I]] - 24.0) <= 0.2).sum(axis=1, dtype=np.int16)
+        hist += np.bincount(strong, minlength=len(hist))
+        count += int((strong >= observed_strong).sum())
+        done += n
+        if _oa.should_stop_early(count, done):
+            print(f"Adaptive stop after {done:,} trials")
+            break
+    n_trials = done
+else:
+    # Shared single pass with delta_scan.py (same seed, same permutations)
+    random_strong_counts, _ = _oa.joint_run(logs, delta_center=24.0, threshold=0.2,
+                                            pairs=pairs, n_trials=n_trials, seed=42)
+    hist = np.bincount(random_strong_counts, minlength=len(pairs) + 1)
+    count = int(hist[observed_strong:].sum())
 
 p_value = count / n_trials
-mean_random = np.mean(random_strong_counts)
-std_random = np.std(random_strong_counts)
+p_upper = (count + 1) / (n_trials + 1)  # Conservative add-one estimator
+
+# Exact tail probability over all 15! relabellings (no Monte Carlo error)
+exact_null = _oa.exact_null_distribution(logs, delta=24.0, threshold=0.2, pairs=pairs)
+p_exact = exact_null[observed_strong:].sum()
+
+strong_values = np.arange(len(hist))
+mean_random = (strong_values * hist).sum() / n_trials
+std_random = np.sqrt(((strong_values - mean_random) ** 2 * hist).sum() / n_trials)
 
 print("\n" + "=" * 70)
 print("RESULTS")
 print("=" * 70)
 print(f"Permutation p-value: {p_value:.6f} ({p_value*100:.4f}%)")
+print(f"Conservative upper bound (add-one): {p_upper:.6f} ({p_upper*100:.4f}%)")
+print(f"Exact p-value (all 15! permutations): {p_exact:.6f} ({p_exact*100:.4f}%)")
 print(f"Number of successes: {count:,} out of {n_trials:,}")
 print(f"Mean random strong matches: {mean_random:.3f}")
 print(f"Std dev random strong matches: {std_random:.3f}")
@@ -117,12 +174,12 @@ print("=" * 70)
 
 # Create visualization
 print("\nGenerating histogram...")
-plot_results(observed_strong, random_strong_counts)
+plot_results(observed_strong, hist)
 
 print("\n" + "=" * 70)
 print("INTERPRETATION")
 print("=" * 70)
 print("Under the null hypothesis (random assignment of log-lengths to labels),")
-print("the probability of obtaining 3 or more strong matches (<=0.2) is 0.0055%.")
+print(f"the probability of obtaining {observed_strong} or more strong matches (<=0.2) is {p_exact*100:.4f}%.")
 print("This suggests the observed pattern is highly unlikely to be coincidental.")
 print("=" * 70)
@@ -7,11 +7,27 @@ Usage examples:
 """
 
 import argparse
-import numpy as np
-import matplotlib.pyplot as plt
-from pathlib import Path
+import functools
+import importlib.util
+import math
 import os
-from scipy.signal import find_peaks
+import sys
+import warnings
+import numpy as np
+from scipy.fft import rfft, rfftfreq
+from scipy.signal import lfilter
+
+# Optional-numba shim (njit/prange stand-ins when numba is missing) from octave_analysis
+_oa_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'octave_analysis.py')
+spec = importlib.util.spec_from_file_location('octave_analysis', _oa_path)
+_oa = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = _oa  # registered first, so numba's on-disk cache can re-import it
+spec.loader.exec_module(_oa)
+HAVE_NUMBA, njit, prange = _oa.HAVE_NUMBA, _oa.njit, _oa.prange
+
+# As in octave_analysis: only cache compiled kernels on disk when this module is
+# registered in sys.modules under its own name, so the cache can re-import it
+_NUMBA_CACHE = getattr(sys.modules.get(__name__), '__dict__', None) is globals()
 
 # Hard-coded canonical structure log10 scales (from your original ladder)
 CANONICAL_LOGS = np.array([
@@ -19,83 +35,383 @@ CANONICAL_LOGS = np.array([
     6.80, 8.84, 12.65, 16.67, 18.665, 20.70, 23.84, 26.64
 ])
 
-def integrate_toy_beta(t_grid, g0=1.0, decay=0.05, pert_amp=0.5, period=24.0):
+# Kernel sources; compiled below with numba (see _jit_kernel), and for float64
+# also ahead of time by _rg_flow_kernels.py
+def _euler_toy_beta(t_grid, g0, decay, pert_amp, period):
+    """Step-by-step Euler loop (compiled with numba when available)."""
+    dt = t_grid[1] - t_grid[0]
+    two_pi_over_period = 2 * math.pi / period
+    g = np.empty_like(t_grid)
+    g[0] = g0
+    for k in range(1, len(t_grid)):
+        beta = -decay * g[k-1] + pert_amp * math.sin(two_pi_over_period * t_grid[k-1])
+        g[k] = g[k-1] + beta * dt
+    return g
+
+
+def _rk4_toy_beta(t_grid, g0, decay, pert_amp, period):
+    """Classic fourth-order Runge-Kutta loop (compiled with numba when available)."""
+    dt = t_grid[1] - t_grid[0]
+    two_pi_over_period = 2 * math.pi / period
+    g = np.empty_like(t_grid)
+    g[0] = g0
+    for k in range(1, len(t_grid)):
+        t = t_grid[k-1]
+        # The forcing is evaluated at t, t + dt/2 (shared by k2 and k3) and t + dt
+        s0 = pert_amp * math.sin(two_pi_over_period * t)
+        s_half = pert_amp * math.sin(two_pi_over_period * (t + 0.5 * dt))
+        s1 = pert_amp * math.sin(two_pi_over_period * (t + dt))
+        k1 = -decay * g[k-1] + s0
+        k2 = -decay * (g[k-1] + 0.5 * dt * k1) + s_half
+        k3 = -decay * (g[k-1] + 0.5 * dt * k2) + s_half
+        k4 = -decay * (g[k-1] + dt * k3) + s1
+        g[k] = g[k-1] + (dt / 6) * (k1 + 2 * k2 + 2 * k3 + k4)
+    return g
+
+
+def _linear_recurrence(forcing, r, g0):
+    """g[0] = g0, g[k] = r * g[k-1] + forcing[k-1] (compiled with numba when available)."""
+    g = np.empty(forcing.shape[0] + 1, dtype=forcing.dtype)
+    g[0] = g0
+    for k in range(1, g.shape[0]):
+        g[k] = r * g[k-1] + forcing[k-1]
+    return g
+
+
+_KERNEL_SOURCES = (_euler_toy_beta, _rk4_toy_beta, _linear_recurrence)
+
+
+def _kernel_source_hash():
+    """Hash of the kernel sources; the AOT build stores it to detect a stale extension."""
+    import hashlib
+    import inspect
+    source = ''.join(inspect.getsource(func) for func in _KERNEL_SOURCES)
+    return int(hashlib.sha256(source.encode()).hexdigest()[:15], 16)
+
+
+try:  # float64 kernels built ahead of time by _rg_flow_kernels.py
+    import _rg_kernels
+except ImportError:
+    _rg_kernels = None
+if _rg_kernels is not None and getattr(_rg_kernels, 'source_hash', lambda: None)() != _kernel_source_hash():
+    warnings.warn("Ignoring _rg_kernels: it was built from different kernel source "
+                  "(rerun _rg_flow_kernels.py to rebuild it)")
+    _rg_kernels = None
+
+
+def _jit_kernel(func, signatures):
+    """Compile a kernel with numba (returned unchanged without numba).
+
+    Without the AOT build the float64/float32 signatures are compiled eagerly
+    at import (or loaded from the on-disk cache in __pycache__), so the first
+    call pays no JIT latency. With it, float64 calls never reach numba, so the
+    kernel is compiled lazily and importing the module compiles nothing.
+    fastmath stays off: the loops are serial recurrences, so reassociation buys
+    nothing and would only change the rounding of g(t).
+    """
+    if _rg_kernels is not None:
+        return njit(cache=_NUMBA_CACHE, boundscheck=False)(func)
+    return njit(signatures, cache=_NUMBA_CACHE, boundscheck=False)(func)
+
+
+_euler_toy_beta = _jit_kernel(_euler_toy_beta, ['float64[:](float64[:], float64, float64, float64, float64)',
+                                                'float32[:](float32[:], float32, float32, float32, float32)'])
+_rk4_toy_beta = _jit_kernel(_rk4_toy_beta, ['float64[:](float64[:], float64, float64, float64, float64)',
+                                            'float32[:](float32[:], float32, float32, float32, float32)'])
+_linear_recurrence = _jit_kernel(_linear_recurrence, ['float64[:](float64[:], float64, float64)',
+                                                      'float32[:](float32[:], float32, float32)'])
+
+
+@njit(parallel=True, cache=_NUMBA_CACHE, boundscheck=False)
+def _euler_toy_beta_batch(t_grid, g0, decay, pert_amp, period):
+    """Euler loop for M parameter sets at once, one row per set, rows in parallel."""
+    M = g0.shape[0]
+    N = t_grid.shape[0]
+    dt = t_grid[1] - t_grid[0]
+    g = np.empty((M, N))
+    for m in prange(M):
+        two_pi_over_period = 2 * math.pi / period[m]
+        g[m, 0] = g0[m]
+        for k in range(1, N):
+            beta = -decay[m] * g[m, k-1] + pert_amp[m] * math.sin(two_pi_over_period * t_grid[k-1])
+            g[m, k] = g[m, k-1] + beta * dt
+    return g
+
+
+def make_t_grid(t_min, t_max, dt, dtype=np.float64):
+    """Uniform grid on [t_min, t_max) with N = round((t_max - t_min) / dt) points.
+
+    Unlike np.arange with a float step, the point count does not depend on
+    accumulated rounding, and the points are computed in float64 before any
+    cast to dtype.
+    """
+    N = int(round((t_max - t_min) / dt))
+    return np.linspace(t_min, t_max, N, endpoint=False, dtype=dtype)
+
+
+def exact_toy_beta(t_grid, g0=1.0, decay=0.05, pert_amp=0.5, period=24.0):
+    """
+    Closed-form solution of dg/dt = -decay * g + pert_amp * sin(ω t), ω = 2π / period,
+    with g(t_grid[0]) = g0:
+
+        g(t) = C exp(-decay (t - t0)) + A sin(ω t) + B cos(ω t)
+
+    where A = pert_amp * decay / (decay² + ω²), B = -pert_amp * ω / (decay² + ω²) and
+    C = g0 - A sin(ω t0) - B cos(ω t0). This is the continuous solution, so it differs
+    from the Euler result of integrate_toy_beta by O(dt).
+    """
+    t_grid = np.asarray(t_grid)
+    omega = 2 * np.pi / period
+    denom = decay * decay + omega * omega
+    A = pert_amp * decay / denom
+    B = -pert_amp * omega / denom
+    t0 = t_grid[0]
+    C = g0 - A * np.sin(omega * t0) - B * np.cos(omega * t0)
+    wt = omega * t_grid
+    return C * np.exp(-decay * (t_grid - t0)) + A * np.sin(wt) + B * np.cos(wt)
+
+
+def _euler_forcing(t_grid, decay, pert_amp, period):
+    """(r, forcing) for the Euler recurrence g[k] = r * g[k-1] + forcing[k-1] on t_grid."""
+    cast = t_grid.dtype.type
+    dt = t_grid[1] - t_grid[0]
+    forcing = (cast(pert_amp) * dt) * np.sin(cast(2 * np.pi / period) * t_grid[:-1])
+    r = cast(1.0) - cast(decay) * dt
+    return r, forcing
+
+
+@functools.lru_cache(maxsize=8)
+def _precompute(t0, t_last, n, dtype, decay, pert_amp, period):
+    """Cached (r, forcing, t[:-1]) for the uniform grid t of n points from t0 to t_last.
+
+    Keyed on a few grid scalars rather than on the grid contents or
+    id(t_grid), so keys stay small and a freed-and-reused id cannot return
+    stale forcing. Callers must check that their grid equals the returned t
+    before using the forcing. The returned arrays are shared between calls and
+    must not be modified.
+    """
+    t = np.linspace(t0, t_last, n).astype(dtype)
+    r, forcing = _euler_forcing(t, decay, pert_amp, period)
+    return r, forcing, t[:-1]
+
+
+def integrate_toy_beta(t_grid, g0=1.0, decay=0.05, pert_amp=0.5, period=24.0, method='filter'):
     """
     Toy ODE: dg/dt = -decay * g + pert_amp * sin(2π t / period)
-    Simple Euler integration.
+    Solved on t_grid by Euler ('filter', 'loop'), RK4 ('rk4') or the closed form
+    ('exact'), chosen by `method`.
+
+    method='filter' applies the Euler update g[k] = (1 - decay*dt) * g[k-1] + dt * forcing[k-1]
+    as a linear recurrence over the precomputed (vectorized) forcing term, in a
+    compiled loop with numba or as an IIR filter without it; method='loop' runs the
+    update one step at a time in a compiled loop, for when the original
+    operation order must be reproduced exactly. method='exact' skips the
+    integration and evaluates the closed form (see exact_toy_beta), and
+    method='rk4' uses classic fourth-order Runge-Kutta, whose O(dt^4) error
+    allows a much coarser grid than Euler for the same accuracy. The
+    'filter' forcing term is cached per grid and (decay, pert_amp, period), so
+    sweeps over g0 only pay for the recurrence.
+
+    g(t) has the dtype of t_grid (float32 or float64; anything else is
+    integrated in float64).
+    """
+    t_grid = np.asarray(t_grid)
+    dtype = t_grid.dtype if t_grid.dtype in (np.float32, np.float64) else np.dtype(np.float64)
+    t_grid = t_grid.astype(dtype, copy=False)
+    cast = dtype.type
+    if method == 'exact':
+        return exact_toy_beta(t_grid, cast(g0), cast(decay), cast(pert_amp), cast(period))
+    if method == 'rk4':
+        rk4 = _rk4_toy_beta
+        if _rg_kernels is not None and dtype == np.float64:
+            rk4 = _rg_kernels.rk4_toy_beta_f64
+        return rk4(t_grid, cast(g0), cast(decay), cast(pert_amp), cast(period))
+    if method == 'loop':
+        euler = _euler_toy_beta
+        if _rg_kernels is not None and dtype == np.float64:
+            euler = _rg_kernels.euler_toy_beta_f64
+        return euler(t_grid, cast(g0), cast(decay), cast(pert_amp), cast(period))
+    if method != 'filter':
+        raise ValueError(f"Unknown integration method: {method!r}")
+    # Sweeps over g0 reuse the forcing for the same uniform grid and (decay,
+    # pert_amp, period); any other grid gets its forcing computed from its own points
+    r, forcing, t_cached = _precompute(float(t_grid[0]), float(t_grid[-1]), len(t_grid), dtype.str,
+                                       float(decay), float(pert_amp), float(period))
+    if not np.array_equal(t_grid[:-1], t_cached):
+        r, forcing = _euler_forcing(t_grid, decay, pert_amp, period)
+    if _rg_kernels is not None and dtype == np.float64:
+        return _rg_kernels.linear_recurrence_f64(forcing, r, cast(g0))
+    if HAVE_NUMBA:
+        return _linear_recurrence(forcing, r, cast(g0))
+    g_rest, _ = lfilter(np.array([1.0], dtype=dtype), np.array([1.0, -r], dtype=dtype), forcing,
+                        zi=np.array([r * g0], dtype=dtype))
+    return np.concatenate((np.array([g0], dtype=dtype), g_rest))
+
+
+def integrate_toy_beta_batch(t_grid, g0=1.0, decay=0.05, pert_amp=0.5, period=24.0):
     """
+    Euler-integrate the toy ODE for a sweep of parameter sets in one call.
+
+    g0, decay, pert_amp and period may be scalars or 1-D arrays; they are
+    broadcast against each other to M parameter sets and g(t) is returned with
+    shape (M, len(t_grid)). Row m matches
+    integrate_toy_beta(t_grid, g0[m], decay[m], pert_amp[m], period[m], method='loop').
+    With numba the rows are integrated in parallel; without it each time step
+    is one vectorized update across the M parameter sets.
+    """
+    t_grid = np.asarray(t_grid, dtype=np.float64)
+    params = np.broadcast_arrays(*(np.atleast_1d(np.asarray(p, dtype=np.float64))
+                                   for p in (g0, decay, pert_amp, period)))
+    if params[0].ndim != 1:
+        raise ValueError("Sweep parameters must be scalars or 1-D arrays")
+    g0, decay, pert_amp, period = (np.ascontiguousarray(p) for p in params)
+    if HAVE_NUMBA:
+        return _euler_toy_beta_batch(t_grid, g0, decay, pert_amp, period)
     dt = t_grid[1] - t_grid[0]
-    g = np.zeros_like(t_grid)
-    g[0] = g0
+    two_pi_over_period = 2 * np.pi / period
+    g = np.empty((len(g0), len(t_grid)))
+    g[:, 0] = g0
     for k in range(1, len(t_grid)):
-        t_prev = t_grid[k-1]
-        beta = -decay * g[k-1] + pert_amp * np.sin(2 * np.pi * t_prev / period)
-        g[k] = g[k-1] + beta * dt
+        beta = -decay * g[:, k-1] + pert_amp * np.sin(two_pi_over_period * t_grid[k-1])
+        g[:, k] = g[:, k-1] + beta * dt
     return g
 
 
-def analyze_fft(t_grid, g, use_window=False):
-    """Compute real FFT, remove mean, return freqs, magnitudes, dominant period."""
+def _power_spectrum(g, use_window=False):
+    """Squared rfft magnitudes of the mean-subtracted signal, and the FFT length.
+
+    The signal is zero-padded to the next power of two, which keeps the FFT on
+    its fastest radix-2 path. Padding interpolates the spectrum onto a finer
+    frequency grid but does not add resolvable frequency content. A float32
+    signal stays in single precision (complex64 spectrum). Squared magnitudes
+    order the bins the same way as magnitudes, without a per-bin sqrt.
+    """
     y = g - np.mean(g)
     N = len(y)
     if use_window:
-        from scipy.signal import hann
+        from scipy.signal.windows import hann
         window = hann(N)
-        y *= window
-    
-    yf = np.fft.rfft(y)
-    xf = np.fft.rfftfreq(N, d=(t_grid[1] - t_grid[0]))
-    mag = np.abs(yf)
-    
-    # Find peaks (ignore DC component at index 0)
-    peaks, _ = find_peaks(mag[1:], height=0.1 * mag.max())
-    peaks += 1  # shift back to original indices
+        y *= window.astype(y.dtype, copy=False)
     
+    n_fft = 1 << (N - 1).bit_length()
+    # y is a private mean-subtracted copy, so the transform may overwrite it
+    yf = rfft(y, n=n_fft, workers=-1, overwrite_x=True)
+    return yf.real * yf.real + yf.imag * yf.imag, n_fft
+
+
+def _spectral_peaks(mag2):
+    """Bin indices of local maxima above 10% of the peak magnitude (1% of the peak power)."""
+    # Ignore the DC component at index 0 (bin 1 is the edge of the non-DC
+    # spectrum, so it is not a peak)
+    inner = mag2[1:-1]
+    is_peak = (inner > mag2[:-2]) & (inner > mag2[2:]) & (inner >= 0.01 * mag2.max())
+    is_peak[0] = False
+    return np.flatnonzero(is_peak) + 1
+
+
+def _interpolate_peak(mag2, idx):
+    """Sub-bin offset of the peak at idx from a parabola through the log power of bins idx-1..idx+1.
+
+    A Gaussian-like peak is a parabola in log space, so the vertex lands much
+    closer to the true frequency than the bin centre does. idx is a strict
+    local maximum, so the curvature is negative and the offset is within ±0.5.
+    """
+    left, centre, right = mag2[idx - 1], mag2[idx], mag2[idx + 1]
+    if left <= 0 or right <= 0:
+        return 0.0
+    l, c, r = np.log(left), np.log(centre), np.log(right)
+    return 0.5 * (l - r) / (l - 2 * c + r)
+
+
+def dominant_period(g, dt, use_window=False):
+    """Return (dominant frequency, dominant period) of g sampled every dt.
+
+    Same peak as analyze_fft_full, without building the frequency or
+    magnitude arrays; meant for parameter sweeps where nothing is plotted.
+    The frequency is refined below the bin spacing by parabolic interpolation.
+    """
+    mag2, n_fft = _power_spectrum(g, use_window)
+    peaks = _spectral_peaks(mag2)
+    if len(peaks) == 0:
+        return 0.0, np.inf
+    idx = peaks[np.argmax(mag2[peaks])]
+    freq = (idx + _interpolate_peak(mag2, idx)) * (1.0 / (n_fft * dt))
+    return freq, 1.0 / freq
+
+
+def analyze_fft_full(t_grid, g, use_window=False):
+    """Compute real FFT, remove mean, return freqs, magnitudes, dominant period
+    and the (up to) three largest peaks, for plotting.
+
+    See _power_spectrum for the padding; dominant_period gives the same
+    dominant frequency (interpolated between bins) without the arrays. The
+    returned top_peaks are bin indices.
+    """
+    mag2, n_fft = _power_spectrum(g, use_window)
+    xf = rfftfreq(n_fft, d=(t_grid[1] - t_grid[0]))
+    peaks = _spectral_peaks(mag2)
+
     if len(peaks) == 0:
+        top_peaks = peaks
         dom_freq = 0.0
         dom_period = np.inf
     else:
-        # Sort peaks by magnitude descending
-        peak_mags = mag[peaks]
-        sorted_idx = np.argsort(peak_mags)[::-1]
-        top_peaks = peaks[sorted_idx][:3]
-        dom_freq = xf[top_peaks[0]]
-        dom_period = 1.0 / dom_freq if dom_freq > 0 else np.inf
+        # Three largest peaks, by magnitude descending
+        top_peaks = peaks[np.argpartition(mag2[peaks], -min(3, len(peaks)))[-3:]]
+        top_peaks = top_peaks[np.argsort(-mag2[top_peaks])]
+        dom_freq = (top_peaks[0] + _interpolate_peak(mag2, top_peaks[0])) * xf[1]
+        dom_period = 1.0 / dom_freq  # peaks start at bin 2, so dom_freq > 0
     
+    # Magnitudes are only needed for plotting; take the square root in place
+    mag = np.sqrt(mag2, out=mag2)
     return xf, mag, dom_freq, dom_period, top_peaks
 
 
 def plot_results(t_grid, g, xf, mag, dom_period, save_dir, top_peaks=None):
+    # Deferred so importing the integration/FFT functions does not load matplotlib.
+    # The figure is drawn on an Agg canvas directly, without pyplot's figure manager
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # One figure and canvas, reused for both plots
+    fig = Figure(figsize=(12, 5), dpi=100, layout='tight')
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
     # Plot 1: g(t) with canonical lines
-    fig1, ax1 = plt.subplots(figsize=(12, 5))
-    ax1.plot(t_grid, g, label='Toy coupling g(t)', color='blue')
+    ax.plot(t_grid, g, label='Toy coupling g(t)', color='blue')
     for log_val in CANONICAL_LOGS:
         if t_grid.min() <= log_val <= t_grid.max():
-            ax1.axvline(log_val, color='gray', linestyle='--', alpha=0.4, linewidth=0.8)
-    ax1.set_xlabel('log₁₀(length)')
-    ax1.set_ylabel('Toy coupling g(t)')
-    ax1.set_title(f'Toy RG Flow Integration (period={dom_period:.2f})')
-    ax1.legend()
-    ax1.grid(True, alpha=0.3)
+            ax.axvline(log_val, color='gray', linestyle='--', alpha=0.4, linewidth=0.8)
+    ax.set_xlabel('log₁₀(length)')
+    ax.set_ylabel('Toy coupling g(t)')
+    ax.set_title(f'Toy RG Flow Integration (period={dom_period:.2f})')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
     out1 = save_dir / 'rg_flow_g_t.png'
-    fig1.savefig(out1, dpi=200, bbox_inches='tight')
-    plt.close(fig1)
+    with open(out1, 'wb') as fh:
+        canvas.print_png(fh)
 
     # Plot 2: FFT
-    fig2, ax2 = plt.subplots(figsize=(10, 5))
-    ax2.plot(xf, mag, color='darkblue')
-    ax2.set_xlabel('Frequency (cycles per log₁₀ unit)')
-    ax2.set_ylabel('Magnitude')
-    ax2.set_title('FFT of g(t)')
-    ax2.grid(True, alpha=0.3)
+    ax.clear()
+    fig.set_size_inches(10, 5)
+    ax.plot(xf, mag, color='darkblue')
+    ax.set_xlabel('Frequency (cycles per log₁₀ unit)')
+    ax.set_ylabel('Magnitude')
+    ax.set_title('FFT of g(t)')
+    ax.grid(True, alpha=0.3)
     if top_peaks is not None and len(top_peaks) > 0:
-        for pk in top_peaks[:3]:
-            ax2.axvline(xf[pk], color='red', linestyle='--', alpha=0.6, linewidth=1.2,
-                        label=f'Peak freq={xf[pk]:.4f} (period={1/xf[pk]:.2f})' if pk == top_peaks[0] else "")
-    ax2.legend()
+        # The dominant peak is drawn and labelled at its interpolated frequency,
+        # matching dom_period; the others at their bin centres
+        dom_freq = 1 / dom_period
+        ax.axvline(dom_freq, color='red', linestyle='--', alpha=0.6, linewidth=1.2,
+                   label=f'Peak freq={dom_freq:.4f} (period={dom_period:.2f})')
+        for pk in top_peaks[1:3]:
+            ax.axvline(xf[pk], color='red', linestyle='--', alpha=0.6, linewidth=1.2)
+    ax.legend()
     out2 = save_dir / 'rg_flow_fft.png'
-    fig2.savefig(out2, dpi=200, bbox_inches='tight')
-    plt.close(fig2)
+    with open(out2, 'wb') as fh:
+        canvas.print_png(fh)
 
     print(f"Saved plots to:\n  {out1}\n  {out2}")
 
@@ -110,28 +426,47 @@ def main():
     parser.add_argument('--t-max', type=float, default=27.0, help='Max log10(length)')
     parser.add_argument('--dt', type=float, default=0.05, help='Time step for integration')
     parser.add_argument('--window', action='store_true', help='Apply Hann window to FFT')
+    parser.add_argument('--method', choices=['filter', 'loop', 'rk4', 'exact'], default='filter',
+                        help='Euler integration as an IIR filter or a compiled step-by-step loop, '
+                             'RK4 (accurate at ~10x larger --dt), or the exact closed-form solution')
+    parser.add_argument('--float32', action='store_true',
+                        help='Integrate and transform in single precision (checked against float64)')
     
     args = parser.parse_args()
 
-    t_grid = np.arange(args.t_min, args.t_max, args.dt)
+    dtype = np.float32 if args.float32 else np.float64
+    t_grid = make_t_grid(args.t_min, args.t_max, args.dt, dtype=dtype)
     print(f"Grid: {len(t_grid)} points, dt={args.dt:.4f}, range={t_grid.min():.1f} to {t_grid.max():.1f}")
 
     g = integrate_toy_beta(t_grid, g0=args.g0, decay=args.decay,
-                           pert_amp=args.pert_amp, period=args.period)
+                           pert_amp=args.pert_amp, period=args.period, method=args.method)
+
+    xf, mag, dom_freq, dom_period, top_peaks = analyze_fft_full(t_grid, g, use_window=args.window)
 
-    xf, mag, dom_freq, dom_period, top_peaks = analyze_fft(t_grid, g, use_window=args.window)
+    if args.float32:
+        # Single precision must not move the answer: compare with a float64 run
+        t_ref = make_t_grid(args.t_min, args.t_max, args.dt)
+        g_ref = integrate_toy_beta(t_ref, g0=args.g0, decay=args.decay,
+                                   pert_amp=args.pert_amp, period=args.period, method=args.method)
+        ref_freq, ref_period = dominant_period(g_ref, t_ref[1] - t_ref[0], use_window=args.window)
+        # The interpolated peak carries float32 noise well below a frequency bin,
+        # so allow 1% of the (zero-padded) bin width rather than fixed decimals
+        bin_width = 1.0 / ((1 << (len(t_ref) - 1).bit_length()) * (t_ref[1] - t_ref[0]))
+        if abs(dom_freq - ref_freq) > 0.01 * bin_width:
+            raise RuntimeError(f"float32 dominant period {dom_period:.6f} differs from "
+                               f"float64 {ref_period:.6f} by more than 1% of a frequency bin")
 
     print(f"Dominant frequency: {dom_freq:.6f} cycles/log10 unit")
     print(f"Dominant period:    {dom_period:.3f} log10 units")
     if len(top_peaks) > 0:
-        print("Top 3 peak frequencies / periods:")
-        for pk in top_peaks[:3]:
-            f = xf[pk]
-            p = 1/f if f > 0 else np.inf
-            print(f"  freq={f:.6f}, period={p:.3f}")
+        print("Top 3 peak frequencies / periods (first interpolated, others at bin centres):")
+        print(f"  freq={dom_freq:.6f}, period={dom_period:.3f}")
+        for pk in top_peaks[1:3]:
+            print(f"  freq={xf[pk]:.6f}, period={1 / xf[pk]:.3f}")
 
+    from pathlib import Path  # only the script entry point touches the filesystem
     save_dir = Path(__file__).resolve().parents[1] / 'figures'
-    os.makedirs(save_dir, exist_ok=True)
+    save_dir.mkdir(parents=True, exist_ok=True)
     
     plot_results(t_grid, g, xf, mag, dom_period, save_dir, top_peaks)
 